@@ -16,8 +16,16 @@ __plugin_meta__ = PluginMetadata(
         "    > 简介：获取当前 Clash 的运行状态概览\n"
         "- clash日志\n"
         "    > 简介：获取已记录的 Clash 日志\n"
+        "- clash规则 [关键词] [page:页码]\n"
+        "    > 简介：浏览与搜索 Clash 规则\n"
+        "- clash代理 [关键词] [page:页码]\n"
+        "    > 简介：浏览与搜索 Clash 代理\n"
+        "- clash流量分布\n"
+        "    > 简介：按国家 / 地区与 ASN 统计当前连接的流量（需配置 GeoIP 数据库）\n"
         "- clash清空日志\n"
         "    > 简介：清空 Clash 日志记录\n"
+        "- clash渲染状态\n"
+        "    > 简介：查看图片渲染队列状态\n"
     ),
     type="application",
     homepage="https://github.com/lgc-NB2Dev/nonebot-plugin-clash",
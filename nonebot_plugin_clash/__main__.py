@@ -1,18 +1,45 @@
-from typing import Awaitable, Callable, Type
+from functools import partial
+from time import monotonic, perf_counter
+from typing import Awaitable, Callable, Dict, Optional, Type
 
 from nonebot import logger, on_command
+from nonebot.adapters import Bot, Event, Message
 from nonebot.matcher import Matcher
+from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
-from nonebot_plugin_alconna.uniseg import Image, UniMessage
+from nonebot_plugin_alconna.uniseg import (
+    Image,
+    MsgTarget,
+    SerializeFailed,
+    Target,
+    UniMessage,
+)
 
+from .catalog import CatalogQuery, proxies_catalog, rules_catalog
 from .clash import ClashController, controller as main_cc
 from .config import config
-from .render import render_logs, render_summary
+from .encode import IMAGE_MIME_MAP, encode_stats, record_encode
+from .geoip import resolver
+from .render import render_catalog, render_geo, render_logs, render_summary
+from .scheduler import (
+    RateLimitedError,
+    RenderFuncType,
+    RenderQueueFullError,
+    scheduler,
+)
+from .text import text_logs, text_summary
+from .utils import auto_convert_unit
 
 ImageRendererType = Callable[[ClashController], Awaitable[bytes]]
+TextRendererType = Callable[[ClashController], str]
 
 PERM = SUPERUSER if config.clash_need_superuser else None
 
+TEXT_ONLY_EXPIRE = 3600
+
+# targets that failed to send an image, replied with text until expired
+text_only_targets: Dict[str, float] = {}
+
 
 async def ensure_connected(matcher: Matcher, cc: ClashController):
     if not cc.connected:
@@ -21,28 +48,195 @@ async def ensure_connected(matcher: Matcher, cc: ClashController):
         await matcher.finish("暂无数据，请稍等一会")
 
 
+def get_target_key(bot: Bot, target: Target) -> str:
+    return f"{bot.adapter.get_name()}:{target.parent_id}:{target.id}"
+
+
+def is_text_only(bot: Bot, target: Target) -> bool:
+    key = get_target_key(bot, target)
+    if key not in text_only_targets:
+        return False
+    if text_only_targets[key] < monotonic():
+        del text_only_targets[key]
+        return False
+    return True
+
+
+def should_send_text(bot: Bot, target: Target) -> bool:
+    if config.clash_text_fallback == "never":
+        return False
+    if config.clash_text_fallback == "always":
+        return True
+    return scheduler.saturated or is_text_only(bot, target)
+
+
+async def send_text(text_func: Callable[[], str]):
+    start = perf_counter()
+    text = text_func()
+    record_encode("text", perf_counter() - start, len(text.encode()))
+    await UniMessage.text(text).finish()
+
+
+async def send_rendered(
+    matcher: Matcher,
+    bot: Bot,
+    event: Event,
+    target: MsgTarget,
+    key: str,
+    func: RenderFuncType,
+    text_func: Optional[Callable[[], str]] = None,
+):
+    if text_func and should_send_text(bot, target):
+        await send_text(text_func)
+
+    try:
+        img = await scheduler.submit(
+            key,
+            func,
+            user_id=event.get_user_id(),
+            group_id=None if target.private else target.id,
+            superuser=await SUPERUSER(bot, event),
+        )
+    except RateLimitedError as e:
+        await matcher.finish(f"操作过于频繁，请 {e.remaining:.0f} 秒后再试")
+    except RenderQueueFullError:
+        if text_func and config.clash_text_fallback != "never":
+            await send_text(text_func)
+        await matcher.finish("渲染队列已满，请稍后再试")
+    except Exception:
+        logger.exception(f"Failed to render {key}")
+        await matcher.finish("渲染图片失败，请检查后台输出")
+
+    msg = UniMessage(
+        Image(raw=img, mimetype=IMAGE_MIME_MAP[config.clash_image_format]),
+    )
+    try:
+        await msg.send()
+    except SerializeFailed:
+        if not text_func or config.clash_text_fallback == "never":
+            raise
+        key = get_target_key(bot, target)
+        logger.warning(f"Failed to send image to {key}, falling back to text")
+        text_only_targets[key] = monotonic() + TEXT_ONLY_EXPIRE
+        await send_text(text_func)
+
+
 def register_image_command(
     func: ImageRendererType,
     *cmd: str,
+    text_func: Optional[TextRendererType] = None,
     **kwargs,
 ) -> Type[Matcher]:
-    async def handler(matcher: Matcher):
+    first, *rest = cmd
+
+    async def handler(matcher: Matcher, bot: Bot, event: Event, target: MsgTarget):
         await ensure_connected(matcher, main_cc)
-        try:
-            img = await func(main_cc)
-        except Exception:
-            logger.exception("Failed to render summary")
-            await matcher.finish("渲染图片失败，请检查后台输出")
-        await UniMessage(Image(raw=img)).send()
+        await send_rendered(
+            matcher,
+            bot,
+            event,
+            target,
+            first,
+            partial(func, main_cc),
+            partial(text_func, main_cc) if text_func else None,
+        )
 
-    first, *rest = cmd
     matcher = on_command(first, aliases=set(rest), permission=PERM, **kwargs)
     matcher.append_handler(handler)
     return matcher
 
 
-register_image_command(render_summary, "clash概览")
-register_image_command(render_logs, "clash日志")
+register_image_command(render_summary, "clash概览", text_func=text_summary)
+register_image_command(render_logs, "clash日志", text_func=text_logs)
+if resolver:
+    register_image_command(render_geo, "clash流量分布")
+
+
+cmd_rules = on_command("clash规则", permission=PERM)
+
+
+@cmd_rules.handle()
+async def handle_rules(
+    matcher: Matcher,
+    bot: Bot,
+    event: Event,
+    target: MsgTarget,
+    arg: Message = CommandArg(),
+):
+    await ensure_connected(matcher, main_cc)
+    query = CatalogQuery.parse(arg.extract_plain_text())
+    try:
+        page = await rules_catalog.query(query, config.clash_catalog_page_size)
+    except Exception:
+        logger.exception("Failed to fetch rules")
+        await matcher.finish("获取规则列表失败，请检查后台输出")
+
+    rows = [[x.rule_type, x.payload, x.proxy] for x in page.items]
+    func = partial(
+        render_catalog,
+        main_cc,
+        "规则",
+        ["类型", "内容", "目标"],
+        rows,
+        page,
+        query,
+    )
+    await send_rendered(matcher, bot, event, target, f"rules:{query}", func)
+
+
+cmd_proxies = on_command("clash代理", permission=PERM)
+
+
+@cmd_proxies.handle()
+async def handle_proxies(
+    matcher: Matcher,
+    bot: Bot,
+    event: Event,
+    target: MsgTarget,
+    arg: Message = CommandArg(),
+):
+    await ensure_connected(matcher, main_cc)
+    query = CatalogQuery.parse(arg.extract_plain_text())
+    try:
+        page = await proxies_catalog.query(query, config.clash_catalog_page_size)
+    except Exception:
+        logger.exception("Failed to fetch proxies")
+        await matcher.finish("获取代理列表失败，请检查后台输出")
+
+    rows = [[x.name, x.proxy_type, x.now or "-"] for x in page.items]
+    func = partial(
+        render_catalog,
+        main_cc,
+        "代理",
+        ["名称", "类型", "当前选择"],
+        rows,
+        page,
+        query,
+    )
+    await send_rendered(matcher, bot, event, target, f"proxies:{query}", func)
+
+
+cmd_render_status = on_command("clash渲染状态", permission=PERM)
+
+
+@cmd_render_status.handle()
+async def handle_render_status(matcher: Matcher):
+    stats = scheduler.stats
+    await matcher.finish(
+        f"渲染中：{scheduler.running} / {scheduler.concurrency}\n"
+        f"排队中：{scheduler.queue_depth} / {scheduler.queue_size}\n"
+        f"平均等待：{stats.avg_wait:.2f}s（最长 {stats.max_wait:.2f}s）\n"
+        f"平均渲染：{stats.avg_render:.2f}s\n"
+        f"已完成：{stats.completed}，失败：{stats.failed}\n"
+        f"合并请求：{stats.coalesced}，"
+        f"拒绝：{stats.rejected}，限流：{stats.rate_limited}"
+        + "".join(
+            f"\n输出 {mode}：{it.count} 次，"
+            f"平均编码 {it.avg_time * 1000:.1f}ms，"
+            f"平均大小 {auto_convert_unit(it.avg_size)}"
+            for mode, it in encode_stats.items()
+        ),
+    )
 
 
 cmd_clear_logs = on_command("clash清空日志", permission=PERM)
@@ -0,0 +1,261 @@
+import asyncio as aio
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from math import ceil
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from nonebot import logger
+from nonebot.compat import type_validate_json
+from nonebot.utils import run_sync
+
+from .clash import ClashAPI, controller
+from .config import config
+from .models import ProxiesData, Proxy, Rule, RulesData
+
+T = TypeVar("T")
+
+FILTER_TYPE_PREFIX = "type:"
+FILTER_TARGET_PREFIX = "target:"
+PAGE_PREFIXES = ("page:", "p:")
+KEYWORD_PREFIX_MARK = "^"
+
+
+@dataclass
+class CatalogQuery:
+    keyword: Optional[str] = None
+    prefix: bool = False
+    item_type: Optional[str] = None
+    target: Optional[str] = None
+    page: int = 1
+
+    @classmethod
+    def parse(cls, text: str) -> "CatalogQuery":
+        query = cls()
+        keywords: List[str] = []
+        # pages need an explicit prefix, so numeric payloads like ports
+        # can still be searched as keywords
+        for token in text.split():
+            lowered = token.lower()
+            page = next(
+                (lowered[len(x) :] for x in PAGE_PREFIXES if lowered.startswith(x)),
+                None,
+            )
+            if page and page.isdigit():
+                query.page = max(1, int(page))
+            elif lowered.startswith(FILTER_TYPE_PREFIX):
+                query.item_type = lowered[len(FILTER_TYPE_PREFIX) :] or None
+            elif lowered.startswith(FILTER_TARGET_PREFIX):
+                query.target = lowered[len(FILTER_TARGET_PREFIX) :] or None
+            else:
+                keywords.append(lowered)
+
+        keyword = " ".join(keywords)
+        if keyword.startswith(KEYWORD_PREFIX_MARK):
+            query.prefix = True
+            keyword = keyword[len(KEYWORD_PREFIX_MARK) :]
+        query.keyword = keyword or None
+        return query
+
+    @property
+    def description(self) -> str:
+        parts: List[str] = []
+        if self.keyword:
+            parts.append(f"{'前缀' if self.prefix else '包含'} {self.keyword}")
+        if self.item_type:
+            parts.append(f"类型 {self.item_type}")
+        if self.target:
+            parts.append(f"目标 {self.target}")
+        return "，".join(parts)
+
+
+@dataclass
+class CatalogPage(Generic[T]):
+    items: List[T]
+    page: int
+    total_pages: int
+    total_hits: int
+    total_items: int
+    took: float
+
+
+class SearchIndex(Generic[T]):
+    def __init__(
+        self,
+        items: List[T],
+        get_name: Callable[[T], str],
+        get_type: Callable[[T], str],
+        get_target: Callable[[T], str],
+    ) -> None:
+        self.items = items
+
+        self.by_type: Dict[str, List[int]] = {}
+        self.by_target: Dict[str, List[int]] = {}
+        names: List[str] = []
+        for i, it in enumerate(items):
+            self.by_type.setdefault(get_type(it).lower(), []).append(i)
+            self.by_target.setdefault(get_target(it).lower(), []).append(i)
+            names.append(get_name(it).lower().replace("\n", " "))
+
+        # all names joined into one string, so substring search is a few
+        # str.find calls instead of a python loop over every item
+        self._haystack = "\n".join(names)
+        self._offsets: List[int] = []
+        offset = 0
+        for name in names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self._sorted_names = [names[i] for i in order]
+        self._sorted_ids = order
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def find_substring(self, keyword: str) -> List[int]:
+        result: List[int] = []
+        pos = self._haystack.find(keyword)
+        while pos != -1:
+            idx = bisect_right(self._offsets, pos) - 1
+            result.append(idx)
+            if idx + 1 >= len(self._offsets):
+                break
+            pos = self._haystack.find(keyword, self._offsets[idx + 1])
+        return result
+
+    def find_prefix(self, keyword: str) -> List[int]:
+        start = bisect_left(self._sorted_names, keyword)
+        end = start
+        while end < len(self._sorted_names) and self._sorted_names[end].startswith(
+            keyword,
+        ):
+            end += 1
+        return sorted(self._sorted_ids[start:end])
+
+    def search(self, query: CatalogQuery) -> List[int]:
+        if query.keyword:
+            hits = (
+                self.find_prefix(query.keyword)
+                if query.prefix
+                else self.find_substring(query.keyword)
+            )
+        elif query.item_type:
+            hits = self.by_type.get(query.item_type, [])
+        elif query.target:
+            hits = self.by_target.get(query.target, [])
+        else:
+            return list(range(len(self.items)))
+
+        if query.item_type:
+            type_ids = set(self.by_type.get(query.item_type, []))
+            hits = [x for x in hits if x in type_ids]
+        if query.target:
+            target_ids = set(self.by_target.get(query.target, []))
+            hits = [x for x in hits if x in target_ids]
+        return hits
+
+
+class Catalog(Generic[T]):
+    def __init__(
+        self,
+        api: ClashAPI,
+        path: str,
+        build_index: Callable[[bytes], SearchIndex[T]],
+        ttl: float = 60,
+    ) -> None:
+        self.api = api
+        self.path = path
+        self.build_index = build_index
+        self.ttl = ttl
+
+        self.index: Optional[SearchIndex[T]] = None
+        self.etag: Optional[str] = None
+        self.fetched_at: float = 0
+        # created lazily so it binds to the running loop on py3.9
+        self._lock: Optional[aio.Lock] = None
+
+    @property
+    def fresh(self) -> bool:
+        return (
+            self.index is not None
+            and time.monotonic() - self.fetched_at < self.ttl
+        )
+
+    async def get_index(self) -> SearchIndex[T]:
+        # concurrent callers wait for the same fetch instead of starting their own
+        if not self._lock:
+            self._lock = aio.Lock()
+        async with self._lock:
+            if self.fresh:
+                assert self.index is not None
+                return self.index
+
+            cached = self.index is not None
+            headers = {"If-None-Match": self.etag} if cached and self.etag else None
+            resp = await self.api.request_raw(self.path, headers)
+            if cached and resp.status_code == 304:
+                logger.debug(f"{self.path} not modified, reusing cached index")
+            else:
+                start = time.perf_counter()
+                self.index = await run_sync(self.build_index)(resp.content)
+                logger.debug(
+                    f"Indexed {len(self.index)} items of {self.path} "
+                    f"({len(resp.content)} bytes) "
+                    f"in {time.perf_counter() - start:.3f}s",
+                )
+                self.etag = resp.headers.get("ETag")
+            self.fetched_at = time.monotonic()
+            assert self.index is not None
+            return self.index
+
+    async def query(self, query: CatalogQuery, page_size: int) -> CatalogPage[T]:
+        index = await self.get_index()
+
+        start = time.perf_counter()
+        hits = index.search(query)
+        total_pages = max(1, ceil(len(hits) / page_size))
+        page = min(query.page, total_pages)
+        page_hits = hits[(page - 1) * page_size : page * page_size]
+        took = time.perf_counter() - start
+
+        return CatalogPage(
+            items=[index.items[i] for i in page_hits],
+            page=page,
+            total_pages=total_pages,
+            total_hits=len(hits),
+            total_items=len(index),
+            took=took,
+        )
+
+
+def build_rules_index(content: bytes) -> SearchIndex[Rule]:
+    return SearchIndex(
+        type_validate_json(RulesData, content).rules,
+        get_name=lambda x: x.payload,
+        get_type=lambda x: x.rule_type,
+        get_target=lambda x: x.proxy,
+    )
+
+
+def build_proxies_index(content: bytes) -> SearchIndex[Proxy]:
+    return SearchIndex(
+        list(type_validate_json(ProxiesData, content).proxies.values()),
+        get_name=lambda x: x.name,
+        get_type=lambda x: x.proxy_type,
+        get_target=lambda x: x.now or "",
+    )
+
+
+rules_catalog = Catalog(
+    controller.api,
+    "rules",
+    build_rules_index,
+    ttl=config.clash_catalog_ttl,
+)
+proxies_catalog = Catalog(
+    controller.api,
+    "proxies",
+    build_proxies_index,
+    ttl=config.clash_catalog_ttl,
+)
@@ -11,8 +11,8 @@ from .config import config
 from .models import MemoryData, TrafficData, WsData
 from .utils import auto_convert_unit
 
-CHART_W = (config.clash_image_width - 30) * 2
-CHART_H = 400
+CHART_W = int((config.clash_image_width - 30) * config.clash_image_scale)
+CHART_H = int(200 * config.clash_image_scale)
 
 UP_COLOR = "#db4d6d"
 UP_BG_COLOR = "#db4d6d80"
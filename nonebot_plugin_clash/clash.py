@@ -1,9 +1,10 @@
 import asyncio as aio
+import json
 from contextlib import suppress
 from functools import partial
-from typing import TYPE_CHECKING, Any, Callable, Generic, Optional, Type, TypeVar
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generic, Optional, Type, TypeVar
 
-from httpx import AsyncClient
+from httpx import AsyncClient, Response
 from nonebot import get_driver, logger
 from nonebot.compat import type_validate_json
 from pydantic import BaseModel
@@ -112,8 +113,16 @@ class ClashAPI:
             return partial(self._call_api, name)
         return object.__getattribute__(self, name)
 
-    async def _call_api(self, path: str, **kwargs) -> Any:
-        headers = {"Authorization": f"Bearer {self.secret}"} if self.secret else None
+    async def request_raw(
+        self,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> Response:
+        headers = {**(headers or {})}
+        if self.secret:
+            headers["Authorization"] = f"Bearer {self.secret}"
+
         async with AsyncClient(base_url=str(self.url)) as cli:
             logger.debug(f"Calling API {path}")
             resp = await cli.get(
@@ -122,14 +131,19 @@ class ClashAPI:
                 timeout=config.api_timeout,
                 params=kwargs,
             )
+        # 304 is a valid answer when revalidating a cached body
+        if resp.status_code != 304:
             resp.raise_for_status()
+        return resp
 
+    async def _call_api(self, path: str, **kwargs) -> Any:
+        resp = await self.request_raw(path, **kwargs)
         if path in API_RETURN_MODEL_MAP:
-            return type_validate_json(API_RETURN_MODEL_MAP[path], resp.text)
+            return type_validate_json(API_RETURN_MODEL_MAP[path], resp.content)
         with suppress(Exception):
-            return resp.json()
+            return json.loads(resp.content)
         with suppress(Exception):
-            return resp.text
+            return resp.content.decode()
         return resp.content
 
 
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Literal, Optional
 from typing_extensions import Annotated
 
@@ -5,6 +6,8 @@ from nonebot import get_plugin_config
 from pydantic import AnyUrl, BaseModel
 
 LogLevelType = Literal["debug", "info", "warn", "error"]
+ImageFormatType = Literal["jpeg", "png", "webp"]
+TextFallbackType = Literal["never", "auto", "always"]
 
 
 class ConfigModel(BaseModel):
@@ -17,6 +20,20 @@ class ConfigModel(BaseModel):
     clash_log_level: LogLevelType = "info"
     clash_log_count: int = 50
     clash_image_width: int = 600
+    clash_image_format: ImageFormatType = "jpeg"
+    clash_image_quality: int = 80
+    clash_image_scale: float = 2
+    clash_image_max_bytes: Optional[int] = None
+    clash_text_fallback: TextFallbackType = "auto"
+    clash_render_concurrency: int = 2
+    clash_render_queue_size: int = 16
+    clash_user_rate_limit: float = 5
+    clash_group_rate_limit: float = 2
+    clash_geoip_country_db: Optional[Path] = None
+    clash_geoip_asn_db: Optional[Path] = None
+    clash_geoip_cache_size: int = 4096
+    clash_catalog_ttl: float = 60
+    clash_catalog_page_size: int = 30
 
 
 config = get_plugin_config(ConfigModel)
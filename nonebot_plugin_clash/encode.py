@@ -0,0 +1,95 @@
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, Optional
+
+from nonebot import logger
+from PIL import Image
+
+from .config import ImageFormatType
+from .utils import SizedList
+
+IMAGE_MIME_MAP: Dict[str, str] = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+MIN_QUALITY = 30
+QUALITY_STEP = 15
+DOWNSCALE_RATIO = 0.75
+MIN_WIDTH = 300
+
+
+@dataclass
+class EncodeStat:
+    count: int = 0
+    times: SizedList[float] = field(default_factory=lambda: SizedList(size=100))
+    sizes: SizedList[int] = field(default_factory=lambda: SizedList(size=100))
+
+    @property
+    def avg_time(self) -> float:
+        return sum(self.times) / len(self.times) if self.times else 0
+
+    @property
+    def avg_size(self) -> float:
+        return sum(self.sizes) / len(self.sizes) if self.sizes else 0
+
+    def record(self, took: float, size: int) -> None:
+        self.count += 1
+        self.times.append(took)
+        self.sizes.append(size)
+
+
+encode_stats: Dict[str, EncodeStat] = {}
+
+
+def record_encode(mode: str, took: float, size: int) -> None:
+    if mode not in encode_stats:
+        encode_stats[mode] = EncodeStat()
+    encode_stats[mode].record(took, size)
+    logger.debug(f"Encoded {mode} output, {size} bytes in {took * 1000:.1f}ms")
+
+
+def save_image(img: Image.Image, image_format: ImageFormatType, quality: int) -> bytes:
+    bio = BytesIO()
+    if image_format == "png":
+        img.save(bio, format="png", optimize=True)
+    else:
+        if image_format == "jpeg" and img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(bio, format=image_format, quality=quality)
+    return bio.getvalue()
+
+
+def encode_image(
+    png: bytes,
+    image_format: ImageFormatType,
+    quality: int,
+    max_bytes: Optional[int] = None,
+) -> bytes:
+    # always start from the lossless screenshot, so lossy formats are only
+    # compressed once per attempt
+    with Image.open(BytesIO(png)) as img:
+        img.load()
+        data = png if image_format == "png" else save_image(img, image_format, quality)
+        if (not max_bytes) or len(data) <= max_bytes:
+            return data
+
+        if image_format != "png":
+            while len(data) > max_bytes and quality > MIN_QUALITY:
+                quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+                data = save_image(img, image_format, quality)
+
+        while len(data) > max_bytes and img.width * DOWNSCALE_RATIO >= MIN_WIDTH:
+            img = img.resize(
+                (int(img.width * DOWNSCALE_RATIO), int(img.height * DOWNSCALE_RATIO)),
+                Image.Resampling.LANCZOS,
+            )
+            data = save_image(img, image_format, quality)
+
+    if len(data) > max_bytes:
+        logger.warning(
+            f"Image is still {len(data)} bytes after compressing, "
+            f"exceeding the budget of {max_bytes} bytes",
+        )
+    return data
@@ -0,0 +1,203 @@
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from nonebot import get_driver, logger
+from nonebot.utils import run_sync
+
+from .config import config
+
+if TYPE_CHECKING:
+    from maxminddb.reader import Reader
+
+    from .models import Connection
+
+driver = get_driver()
+
+UNKNOWN_NAME = "未知"
+OTHERS_NAME = "其他"
+
+
+@dataclass(frozen=True)
+class GeoInfo:
+    country: Optional[str] = None
+    country_name: Optional[str] = None
+    asn: Optional[int] = None
+    as_org: Optional[str] = None
+
+
+@dataclass
+class TrafficBucket:
+    name: str
+    upload: int = 0
+    download: int = 0
+    connections: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.upload + self.download
+
+    def add(self, upload: int, download: int, connections: int = 1) -> None:
+        self.upload += upload
+        self.download += download
+        self.connections += connections
+
+
+@dataclass
+class GeoBreakdown:
+    countries: List[TrafficBucket] = field(default_factory=list)
+    asns: List[TrafficBucket] = field(default_factory=list)
+    connections: int = 0
+    unique_ips: int = 0
+    took: float = 0
+
+
+def open_reader(path: Path) -> "Reader":
+    import maxminddb
+
+    # MODE_AUTO prefers the C extension and falls back to the pure python
+    # reader, both are memory-mapped
+    return maxminddb.open_database(str(path), maxminddb.MODE_AUTO)
+
+
+def pick_name(names: Dict[str, str]) -> Optional[str]:
+    return names.get("zh-CN") or names.get("en")
+
+
+def collapse_buckets(
+    buckets: Iterable[TrafficBucket],
+    top_n: int,
+) -> List[TrafficBucket]:
+    ordered = sorted(buckets, key=lambda x: x.total, reverse=True)
+    if len(ordered) <= top_n:
+        return ordered
+    others = TrafficBucket(OTHERS_NAME)
+    for it in ordered[top_n:]:
+        others.add(it.upload, it.download, it.connections)
+    return [*ordered[:top_n], others]
+
+
+class GeoIPResolver:
+    def __init__(
+        self,
+        country_db: Optional[Path] = None,
+        asn_db: Optional[Path] = None,
+        cache_size: int = 4096,
+    ) -> None:
+        self._readers: List["Reader"] = []
+        if country_db:
+            self._readers.append(open_reader(country_db))
+        # a combined database only needs to be opened once
+        if asn_db and asn_db != country_db:
+            self._readers.append(open_reader(asn_db))
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, ip: str) -> GeoInfo:
+        info: Dict[str, Any] = {}
+        for reader in self._readers:
+            try:
+                record = reader.get(ip)
+            except ValueError:
+                # e.g. an IPv6 address against an IPv4-only database
+                continue
+            if not isinstance(record, dict):
+                continue
+
+            country = record.get("country") or record.get("registered_country")
+            if isinstance(country, dict) and "country" not in info:
+                info["country"] = country.get("iso_code")
+                info["country_name"] = pick_name(country.get("names", {}))
+
+            if "autonomous_system_number" in record and "asn" not in info:
+                info["asn"] = record["autonomous_system_number"]
+                info["as_org"] = record.get("autonomous_system_organization")
+        return GeoInfo(**info)
+
+    def breakdown(
+        self,
+        connections: List["Connection"],
+        top_n: int = 10,
+    ) -> GeoBreakdown:
+        start = time.perf_counter()
+        ips = {x.metadata.destination_ip for x in connections}
+        ips.discard("")
+        infos = {ip: self.lookup(ip) for ip in ips}
+
+        countries: Dict[Optional[str], TrafficBucket] = {}
+        asns: Dict[Optional[int], TrafficBucket] = {}
+        for conn in connections:
+            info = infos.get(conn.metadata.destination_ip) or GeoInfo()
+
+            if info.country not in countries:
+                countries[info.country] = TrafficBucket(
+                    (
+                        f"{info.country_name or info.country} ({info.country})"
+                        if info.country
+                        else UNKNOWN_NAME
+                    ),
+                )
+            countries[info.country].add(conn.upload, conn.download)
+
+            if info.asn not in asns:
+                asns[info.asn] = TrafficBucket(
+                    (
+                        f"AS{info.asn} {info.as_org or ''}".strip()
+                        if info.asn
+                        else UNKNOWN_NAME
+                    ),
+                )
+            asns[info.asn].add(conn.upload, conn.download)
+
+        return GeoBreakdown(
+            countries=collapse_buckets(countries.values(), top_n),
+            asns=collapse_buckets(asns.values(), top_n),
+            connections=len(connections),
+            unique_ips=len(ips),
+            took=time.perf_counter() - start,
+        )
+
+    async def breakdown_async(
+        self,
+        connections: List["Connection"],
+        top_n: int = 10,
+    ) -> GeoBreakdown:
+        return await run_sync(self.breakdown)(connections, top_n)
+
+    def close(self) -> None:
+        for reader in self._readers:
+            reader.close()
+        self._readers.clear()
+        self.lookup.cache_clear()
+
+
+def create_resolver() -> Optional[GeoIPResolver]:
+    if not (config.clash_geoip_country_db or config.clash_geoip_asn_db):
+        return None
+    try:
+        import maxminddb  # noqa: F401
+    except ImportError:
+        logger.warning(
+            "GeoIP database configured but `maxminddb` is not installed, "
+            "install `nonebot-plugin-clash[geoip]` to enable it",
+        )
+        return None
+    try:
+        return GeoIPResolver(
+            config.clash_geoip_country_db,
+            config.clash_geoip_asn_db,
+            config.clash_geoip_cache_size,
+        )
+    except Exception:
+        logger.exception("Failed to open GeoIP database")
+        return None
+
+
+resolver = create_resolver()
+
+
+@driver.on_shutdown
+async def _():
+    if resolver:
+        resolver.close()
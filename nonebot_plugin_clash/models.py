@@ -1,6 +1,6 @@
 import time
 from dataclasses import dataclass, field
-from typing import Any, Generic, List, Optional, TypeVar
+from typing import Any, Dict, Generic, List, Optional, TypeVar
 
 from cookit.pyd import CamelAliasModel, field_validator
 from nonebot.compat import PYDANTIC_V2, type_validate_python
@@ -82,6 +82,28 @@ class LogData(BaseModel):
     payload: str
 
 
+class Rule(BaseModel):
+    rule_type: str = Field(alias="type")
+    payload: str
+    proxy: str
+
+
+class RulesData(BaseModel):
+    rules: List[Rule]
+
+
+class Proxy(BaseModel):
+    name: str
+    proxy_type: str = Field(alias="type")
+    udp: bool = False
+    now: Optional[str] = None
+    all: Optional[List[str]] = None
+
+
+class ProxiesData(BaseModel):
+    proxies: Dict[str, Proxy]
+
+
 API_RETURN_MODEL_MAP = {
     "version": Version,
 }
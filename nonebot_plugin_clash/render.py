@@ -1,17 +1,22 @@
 from contextlib import asynccontextmanager
 from functools import partial
 from pathlib import Path
-from typing import AsyncIterator, Literal
+from time import perf_counter
+from typing import Any, AsyncIterator, List
 
 import jinja2
 from nonebot import logger
+from nonebot.utils import run_sync
 from nonebot_plugin_htmlrender import get_new_page
 from playwright.async_api import Page, Request, Route
 from yarl import URL
 
+from .catalog import CatalogPage, CatalogQuery
 from .chart import render_memory_chart, render_traffic_chart
 from .clash import ClashController
-from .config import config
+from .config import ImageFormatType, config
+from .encode import encode_image, record_encode
+from .geoip import resolver
 from .utils import auto_convert_unit, b2url, format_timestamp
 
 RES_DIR = Path(__file__).parent / "res"
@@ -40,7 +45,7 @@ async def router(route: Route, request: Request):
 
 @asynccontextmanager
 async def get_routed_page() -> AsyncIterator[Page]:
-    async with get_new_page() as page:
+    async with get_new_page(device_scale_factor=config.clash_image_scale) as page:
         await page.route(f"{ROUTE_BASE_URL}**", router)
         await page.goto(f"{ROUTE_BASE_URL}index.html")
         yield page
@@ -49,12 +54,25 @@ async def get_routed_page() -> AsyncIterator[Page]:
 async def screenshot_elem(
     page: Page,
     selector: str,
-    image_format: Literal["jpeg", "png"] = "jpeg",
+    image_format: ImageFormatType = config.clash_image_format,
+    quality: int = config.clash_image_quality,
     **kwargs,
 ) -> bytes:
     elem = await page.wait_for_selector(selector)
     assert elem
-    return await elem.screenshot(type=image_format, **kwargs)
+
+    start = perf_counter()
+    max_bytes = config.clash_image_max_bytes
+    if image_format == "jpeg" and not max_bytes:
+        # no budget to fit, let the browser produce the final jpeg directly
+        data = await elem.screenshot(type="jpeg", quality=quality, **kwargs)
+    else:
+        # take a lossless screenshot and do the only lossy encode ourselves,
+        # browsers can't screenshot to webp anyway
+        raw = await elem.screenshot(type="png", **kwargs)
+        data = await run_sync(encode_image)(raw, image_format, quality, max_bytes)
+    record_encode(image_format, perf_counter() - start, len(data))
+    return data
 
 
 async def generic_render(cc: ClashController, template_name: str, **kwargs) -> bytes:
@@ -80,3 +98,34 @@ async def render_summary(cc: ClashController) -> bytes:
 
 
 render_logs = partial(generic_render, template_name="logs.html.jinja")
+
+
+async def render_catalog(
+    cc: ClashController,
+    title: str,
+    columns: List[str],
+    rows: List[List[Any]],
+    page: CatalogPage,
+    query: CatalogQuery,
+) -> bytes:
+    return await generic_render(
+        cc,
+        "catalog.html.jinja",
+        title=title,
+        columns=columns,
+        rows=rows,
+        page=page,
+        query=query,
+    )
+
+
+async def render_geo(cc: ClashController) -> bytes:
+    assert resolver
+    connections = cc.connections_ws.data.last
+    assert connections
+    breakdown = await resolver.breakdown_async(connections.data.connections)
+    logger.debug(
+        f"GeoIP breakdown of {breakdown.connections} connections "
+        f"({breakdown.unique_ips} unique IPs) took {breakdown.took:.3f}s",
+    )
+    return await generic_render(cc, "geo.html.jinja", breakdown=breakdown)
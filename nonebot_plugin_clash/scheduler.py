@@ -0,0 +1,279 @@
+import asyncio as aio
+import time
+from dataclasses import dataclass, field, replace
+from itertools import count
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from nonebot import get_driver, logger
+
+from .config import config
+from .utils import SizedList
+
+driver = get_driver()
+
+RenderFuncType = Callable[[], Awaitable[bytes]]
+
+PRIORITY_SUPERUSER = 0
+PRIORITY_NORMAL = 1
+
+
+class RenderQueueFullError(Exception):
+    pass
+
+
+class RateLimitedError(Exception):
+    def __init__(self, remaining: float) -> None:
+        super().__init__(f"Rate limited, retry after {remaining:.1f}s")
+        self.remaining = remaining
+
+
+@dataclass(order=True)
+class RenderJob:
+    priority: int
+    seq: int
+    key: str = field(compare=False)
+    func: RenderFuncType = field(compare=False)
+    future: "aio.Future[bytes]" = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    waiters: int = field(compare=False, default=1)
+
+
+@dataclass
+class RenderStats:
+    submitted: int = 0
+    coalesced: int = 0
+    rejected: int = 0
+    rate_limited: int = 0
+    completed: int = 0
+    failed: int = 0
+    max_wait: float = 0
+    wait_times: SizedList[float] = field(default_factory=lambda: SizedList(size=100))
+    render_times: SizedList[float] = field(
+        default_factory=lambda: SizedList(size=100),
+    )
+
+    @property
+    def avg_wait(self) -> float:
+        return sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0
+
+    @property
+    def avg_render(self) -> float:
+        return (
+            sum(self.render_times) / len(self.render_times)
+            if self.render_times
+            else 0
+        )
+
+
+class RateLimiter:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._last: Dict[str, float] = {}
+
+    def remaining(self, key: str) -> float:
+        if self.interval <= 0 or key not in self._last:
+            return 0
+        return max(0, self._last[key] + self.interval - time.monotonic())
+
+    def hit(self, key: str) -> None:
+        if self.interval <= 0:
+            return
+        now = time.monotonic()
+        self._last[key] = now
+        # drop expired entries so the dict doesn't grow forever
+        if len(self._last) > 1024:
+            self._last = {
+                k: v for k, v in self._last.items() if now - v < self.interval
+            }
+
+    def clear(self, key: str) -> None:
+        self._last.pop(key, None)
+
+
+class RenderScheduler:
+    def __init__(
+        self,
+        concurrency: int = 2,
+        queue_size: int = 16,
+        user_interval: float = 0,
+        group_interval: float = 0,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.user_limiter = RateLimiter(user_interval)
+        self.group_limiter = RateLimiter(group_interval)
+        self.stats = RenderStats()
+
+        # created in start() so it binds to the running loop on py3.9
+        self._queue: "Optional[aio.PriorityQueue[RenderJob]]" = None
+        self._pending: Dict[str, RenderJob] = {}
+        self._workers: List[aio.Task] = []
+        self._running = 0
+        self._seq = count()
+
+    @property
+    def queue_depth(self) -> int:
+        # stale entries of requeued jobs are still in the queue, only count
+        # the jobs that are actually waiting
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def saturated(self) -> bool:
+        return self.queue_size > 0 and self.queue_depth >= self.queue_size
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        if not self._queue:
+            self._queue = aio.PriorityQueue()
+        self._workers = [
+            aio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await aio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queue = None
+        for job in self._pending.values():
+            if not job.future.done():
+                job.future.cancel()
+        self._pending.clear()
+
+    def check_rate_limit(self, user_id: str, group_id: Optional[str]) -> None:
+        remaining = max(
+            self.user_limiter.remaining(user_id),
+            self.group_limiter.remaining(group_id) if group_id else 0,
+        )
+        if remaining > 0:
+            self.stats.rate_limited += 1
+            raise RateLimitedError(remaining)
+
+    async def submit(
+        self,
+        key: str,
+        func: RenderFuncType,
+        user_id: Optional[str] = None,
+        group_id: Optional[str] = None,
+        superuser: bool = False,
+    ) -> bytes:
+        limited_user = None if superuser else user_id
+
+        self.start()
+        assert self._queue
+        if job := self._pending.get(key):
+            # someone is already waiting for this renderer, share the result
+            if superuser and job.priority > PRIORITY_SUPERUSER:
+                # requeue with superuser priority, the old entry becomes stale
+                # and is skipped by the worker as it's no longer pending
+                job = replace(
+                    job,
+                    priority=PRIORITY_SUPERUSER,
+                    seq=next(self._seq),
+                )
+                self._pending[key] = job
+                self._queue.put_nowait(job)
+            job.waiters += 1
+            self.stats.coalesced += 1
+            # joining a queued render is free and leaves the limits untouched
+            limited_user = None
+            logger.debug(f"Coalesced render request {key} ({job.waiters} waiters)")
+        else:
+            if limited_user:
+                self.check_rate_limit(limited_user, group_id)
+            if self.saturated:
+                self.stats.rejected += 1
+                raise RenderQueueFullError
+            job = RenderJob(
+                priority=PRIORITY_SUPERUSER if superuser else PRIORITY_NORMAL,
+                seq=next(self._seq),
+                key=key,
+                func=func,
+                future=aio.get_running_loop().create_future(),
+            )
+            self._pending[key] = job
+            self._queue.put_nowait(job)
+            self.stats.submitted += 1
+            if limited_user:
+                self.user_limiter.hit(limited_user)
+                if group_id:
+                    self.group_limiter.hit(group_id)
+
+        try:
+            # shield so one cancelled waiter doesn't cancel the shared render
+            return await aio.shield(job.future)
+        except BaseException:
+            # don't lock the user out for a render they never received
+            if limited_user:
+                self.user_limiter.clear(limited_user)
+                if group_id:
+                    self.group_limiter.clear(group_id)
+            raise
+
+    async def _worker(self) -> None:
+        assert self._queue
+        while True:
+            job = await self._queue.get()
+            if self._pending.get(job.key) is not job:
+                # stale entry of a job that was requeued with superuser priority
+                self._queue.task_done()
+                continue
+            del self._pending[job.key]
+            if job.future.done():
+                # already settled, e.g. cancelled on shutdown
+                self._queue.task_done()
+                continue
+
+            wait = time.monotonic() - job.enqueued_at
+            self.stats.wait_times.append(wait)
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+
+            self._running += 1
+            start = time.monotonic()
+            try:
+                result = await job.func()
+            except aio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.stats.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                self.stats.completed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+            took = time.monotonic() - start
+            self.stats.render_times.append(took)
+            logger.debug(
+                f"Rendered {job.key} for {job.waiters} waiter(s), "
+                f"waited {wait:.3f}s, took {took:.3f}s, "
+                f"queue depth {self.queue_depth}",
+            )
+
+
+scheduler = RenderScheduler(
+    concurrency=config.clash_render_concurrency,
+    queue_size=config.clash_render_queue_size,
+    user_interval=config.clash_user_rate_limit,
+    group_interval=config.clash_group_rate_limit,
+)
+
+
+@driver.on_startup
+async def _():
+    scheduler.start()
+
+
+@driver.on_shutdown
+async def _():
+    await scheduler.stop()
@@ -0,0 +1,37 @@
+from .clash import ClashController
+from .utils import auto_convert_unit, format_timestamp
+
+TEXT_LOG_LINES = 20
+
+
+def text_summary(cc: ClashController) -> str:
+    traffic = cc.traffic_ws.data.last
+    connections = cc.connections_ws.data.last
+    assert traffic
+    assert connections
+
+    memory = (
+        auto_convert_unit(connections.data.memory)
+        if cc.is_meta and connections.data.memory is not None
+        else "需要 Clash Meta"
+    )
+    return (
+        "Clash 概览\n"
+        f"上传：{auto_convert_unit(traffic.data.up, suffix='/s')}\n"
+        f"下载：{auto_convert_unit(traffic.data.down, suffix='/s')}\n"
+        f"上传总量：{auto_convert_unit(connections.data.upload_total)}\n"
+        f"下载总量：{auto_convert_unit(connections.data.download_total)}\n"
+        f"活动连接：{len(connections.data.connections)}\n"
+        f"内存使用情况：{memory}"
+    )
+
+
+def text_logs(cc: ClashController) -> str:
+    logs = cc.logs_ws.data[-TEXT_LOG_LINES:]
+    if not logs:
+        return "暂无日志"
+    lines = (
+        f"[{format_timestamp(x.time)}] {x.data.level.upper()} {x.data.payload}"
+        for x in logs
+    )
+    return "\n".join(("Clash 日志", *lines))